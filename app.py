@@ -1,53 +1,155 @@
 # app.py
 import os
+import re
+import mmap
 import json
-import copy
-from datetime import datetime
+import hashlib
+import time
+import threading
 from pathlib import Path
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import streamlit as st
 
 load_dotenv()
 DATA_DIR = Path(os.getenv("DATA_DIR", "daybyday_data"))
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 USERS_FILE = DATA_DIR / "users.json"
-PROJECTS_FILE = DATA_DIR / "projects.json"
+PROJECTS_FILE = DATA_DIR / "projects.json"  # legacy single-file store, split on first start
+PROJECTS_DIR = DATA_DIR / "projects"
+PROJECTS_MIGRATED = PROJECTS_DIR / ".migrated"  # written once the legacy split completes
+AI_CACHE_FILE = DATA_DIR / "gemini_cache.json"
+HOME_ACTION_COLS = (0.6, 0.4)
+MMAP_THRESHOLD = 64 * 1024  # files at least this big are parsed straight from a mapping
+DURABLE_WRITES = os.getenv("DURABLE_WRITES") == "1"
+PRETTY_JSON = os.getenv("PRETTY_JSON") == "1"  # indent data files, for debugging
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+AI_CACHE_TTL = 3600  # seconds a cached Gemini reply stays valid
+AI_CACHE_MAX = 256
+# tasks are stored flat as {"day": 1..8, "text": ...}, ordered by day
+DAYS = range(1, 9)
+PLANNER_COLUMNS = {
+    "day": st.column_config.SelectboxColumn("Day", options=list(DAYS), default=1, required=True),
+    "text": st.column_config.TextColumn("Task", required=True),
+}
 
 try:
-    import google.generativeai as genai
-    if hasattr(genai, "configure") and GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
-    HAS_GENAI = True
+    import orjson
+    HAS_ORJSON = True
 except Exception:
-    genai = None
-    HAS_GENAI = False
+    orjson = None
+    HAS_ORJSON = False
+
+def _dumps(obj, pretty: bool = False) -> bytes:
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _loads(data):
+    return orjson.loads(data) if HAS_ORJSON else json.loads(data)
+
+# a JSON round-trip is a much cheaper deep copy than copy.deepcopy for this data
+def _clone(obj):
+    return _loads(_dumps(obj))
+
+# path -> (mtime_ns, parsed obj, hash of last written bytes or None). Reads are a
+# dict lookup while the file's mtime is unchanged, and write_json stores what it
+# wrote, so no-op saves skip the disk. Held in cache_resource because module
+# globals are rebuilt on every rerun. Results are shared across sessions: treat
+# them as read-only and copy before changing anything.
+@st.cache_resource(show_spinner=False)
+def _json_cache():
+    return {}
+
+def _mtime_ns(path: Path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+# only orjson can parse a mapping in place; stdlib json would need it copied to bytes
+def _load_file(path: Path):
+    with open(path, "rb") as f:
+        if not HAS_ORJSON or os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return _loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _loads(view)
 
 def read_json(path: Path, default):
+    mtime = _mtime_ns(path)
+    if mtime is None:
+        return default
+    cache = _json_cache()
+    hit = cache.get(str(path))
+    if hit and hit[0] == mtime:
+        return hit[1]
     try:
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        obj = _load_file(path)
     except Exception:
-        pass
-    return default
+        return default
+    cache[str(path)] = (mtime, obj, None)
+    return obj
 
 def write_json(path: Path, obj):
+    data = _dumps(obj, PRETTY_JSON)
+    digest = hash(data)
+    cache = _json_cache()
+    hit = cache.get(str(path))
+    if hit and hit[2] == digest and hit[0] == _mtime_ns(path):
+        return
     tmp = path.with_suffix(".tmp")
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
-    tmp.replace(path)
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if DURABLE_WRITES:
+                f.flush()
+                os.fsync(f.fileno())
+        tmp.replace(path)
+    except Exception:
+        cache.pop(str(path), None)
+        raise
+    cache[str(path)] = (_mtime_ns(path), obj, digest)
 
 def ensure_file(path: Path, default):
     if not path.exists():
         write_json(path, default)
 
-ensure_file(USERS_FILE, {})
-ensure_file(PROJECTS_FILE, {})
+# projects are sharded one file per user so a save only rewrites that user's data;
+# the sanitized name keeps files readable and the hash keeps e.g. "x.y" and "x_y"
+# (or "A" and "a" on case-insensitive filesystems) in separate shards
+def _user_projects_path(username):
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', username)
+    digest = hashlib.sha256(username.encode("utf-8")).hexdigest()[:12]
+    return PROJECTS_DIR / f"{safe}-{digest}.json"
+
+# resumable: shards that already exist (from an interrupted split, or saved since)
+# are left alone, and the marker is only written after every user has a shard
+def _migrate_projects_file():
+    if not PROJECTS_FILE.exists() or PROJECTS_MIGRATED.exists():
+        return
+    for username, projects in read_json(PROJECTS_FILE, {}).items():
+        path = _user_projects_path(username)
+        if not path.exists():
+            write_json(path, projects)
+    PROJECTS_MIGRATED.touch()
+
+# storage setup runs once per process rather than on every script rerun
+@st.cache_resource(show_spinner=False)
+def _init_storage():
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    PROJECTS_DIR.mkdir(exist_ok=True)
+    ensure_file(USERS_FILE, {})
+    _migrate_projects_file()
+    return True
+
+_init_storage()
 
 # --- login helpers kept (unused) to avoid changing other parts ---
 def signup_local(username, password):
-    users = read_json(USERS_FILE, {})
+    users = dict(read_json(USERS_FILE, {}))
     if not username:
         return False, "Username required"
     if username in users:
@@ -65,40 +167,128 @@ def login_local(username, password):
     return True, "Login successful"
 
 def load_user_projects(username):
-    all_proj = read_json(PROJECTS_FILE, {})
-    return all_proj.get(username, {})
+    return read_json(_user_projects_path(username), {})
+
+# reads a user's projects once, lets the caller apply any number of changes, and
+# writes once on exit. The body edits a private copy, so other sessions never see
+# unsaved changes, and if it raises nothing is written; write_json only caches the
+# new dict once it is on disk.
+@contextmanager
+def user_projects_txn(username):
+    path = _user_projects_path(username)
+    projects = _clone(read_json(path, {}))
+    yield projects
+    write_json(path, projects)
 
 def save_user_project(username, project):
-    all_proj = read_json(PROJECTS_FILE, {})
-    if username not in all_proj:
-        all_proj[username] = {}
-    all_proj[username][project["title"]] = copy.deepcopy(project)
-    write_json(PROJECTS_FILE, all_proj)
+    with user_projects_txn(username) as projects:
+        projects[project["title"]] = _clone(project)
 
 def delete_user_project(username, title):
-    all_proj = read_json(PROJECTS_FILE, {})
-    if username in all_proj and title in all_proj[username]:
-        del all_proj[username][title]
-        write_json(PROJECTS_FILE, all_proj)
+    with user_projects_txn(username) as projects:
+        projects.pop(title, None)
+
+# google.generativeai is imported and configured on first use, not on every rerun
+@st.cache_resource(show_spinner=False)
+def _get_model():
+    if not GEMINI_API_KEY:
+        return None
+    try:
+        import google.generativeai as genai
+    except Exception:
+        return None
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+# finished Gemini replies keyed by prompt hash, shared across sessions and saved
+# to AI_CACHE_FILE so repeated prompts skip the API even after a restart. `lock`
+# guards the dict; `write_lock` only orders the file writes, so lookups never wait
+# on the disk.
+@st.cache_resource(show_spinner=False)
+def _ai_cache():
+    return dict(read_json(AI_CACHE_FILE, {})), threading.Lock(), threading.Lock()
+
+# the model is part of the key so a GEMINI_MODEL change never serves another model's
+# replies from the on-disk cache
+def _ai_cache_key(prompt: str, max_output_tokens: int):
+    return f"{GEMINI_MODEL}:{max_output_tokens}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+def _ai_cache_get(key):
+    cache, lock, _ = _ai_cache()
+    with lock:
+        hit = cache.get(key)
+    if hit and time.time() - hit[0] < AI_CACHE_TTL:
+        return hit[1]
+    return None
+
+def _ai_cache_put(key, text):
+    cache, lock, write_lock = _ai_cache()
+    with write_lock:
+        now = time.time()
+        with lock:
+            # re-insert so a refreshed entry moves to the newest end of the order
+            cache.pop(key, None)
+            cache[key] = [now, text]
+            for k in [k for k, (ts, _) in cache.items() if now - ts >= AI_CACHE_TTL]:
+                del cache[k]
+            while len(cache) > AI_CACHE_MAX:
+                del cache[next(iter(cache))]
+            snapshot = dict(cache)
+        # persisting is best effort: the reply is already cached in memory
+        try:
+            write_json(AI_CACHE_FILE, snapshot)
+        except Exception:
+            pass
+
+# both call paths cache the reply stripped, so a hit looks the same whichever filled
+# it; empty (e.g. blocked) replies are never cached
+def _record_stream(key, chunks):
+    parts = []
+    for text in chunks:
+        parts.append(text)
+        yield text
+    text = "".join(parts).strip()
+    if text:
+        _ai_cache_put(key, text)
 
 def call_gemini_text(prompt: str, max_output_tokens: int = 400):
-    if not HAS_GENAI or not GEMINI_API_KEY:
+    # configure/GenerativeModel failures (e.g. a bad model name) surface as an error
+    # result, not an uncaught exception; cache_resource doesn't cache the failure
+    try:
+        model = _get_model()
+    except Exception as e:
+        return False, f"Gemini error: {e}"
+    if model is None:
         return False, "Gemini not configured. Add GEMINI_API_KEY in .env."
+    key = _ai_cache_key(prompt, max_output_tokens)
+    cached = _ai_cache_get(key)
+    if cached is not None:
+        return True, cached
     try:
-        if hasattr(genai, "models") and hasattr(genai.models, "generate_text"):
-            resp = genai.models.generate_text(model="gemini-1.0", prompt=prompt, max_output_tokens=max_output_tokens)
-            text = getattr(resp, "text", None)
-            if text is None and isinstance(resp, dict):
-                text = resp.get("content") or resp.get("output")
-            return True, str(text).strip()
-        elif hasattr(genai, "chat") and hasattr(genai.chat, "create"):
-            resp = genai.chat.create(model="gemini-1.0", messages=[{"role": "user", "content": prompt}])
-            text = getattr(resp, "text", None) or getattr(resp, "output", None)
-            return True, str(text).strip()
-        else:
-            return False, "Unsupported Gemini SDK version"
+        resp = model.generate_content(prompt, generation_config={"max_output_tokens": max_output_tokens})
+        text = str(resp.text).strip()
+    except Exception as e:
+        return False, f"Gemini error: {e}"
+    if text:
+        _ai_cache_put(key, text)
+    return True, text
+
+def call_gemini_stream(prompt: str, max_output_tokens: int = 400):
+    try:
+        model = _get_model()
     except Exception as e:
         return False, f"Gemini error: {e}"
+    if model is None:
+        return False, "Gemini not configured. Add GEMINI_API_KEY in .env."
+    key = _ai_cache_key(prompt, max_output_tokens)
+    cached = _ai_cache_get(key)
+    if cached is not None:
+        return True, iter([cached])
+    try:
+        resp = model.generate_content(prompt, generation_config={"max_output_tokens": max_output_tokens}, stream=True)
+    except Exception as e:
+        return False, f"Gemini error: {e}"
+    return True, _record_stream(key, (chunk.text for chunk in resp if chunk.parts))
 
 # --- removed login page entirely (kept function name but routes nowhere) ---
 def page_login_signup():
@@ -110,12 +300,12 @@ def page_home():
     projects = load_user_projects(st.session_state.user)
     st.write("Your Projects:")
     if projects:
-        for title, proj in projects.items():
+        for title, proj in list(projects.items()):
             with st.expander(title):
                 st.write(proj.get("description", ""))
-                c1, c2 = st.columns([0.6, 0.4])
+                c1, c2 = st.columns(HOME_ACTION_COLS)
                 if c1.button(f"Open {title}", key=f"open_{title}"):
-                    st.session_state.project = copy.deepcopy(proj)
+                    st.session_state.project = _clone(proj)
                     st.session_state.page = "planner"
                     st.rerun()
                 if c2.button(f"Delete {title}", key=f"del_{title}"):
@@ -125,23 +315,26 @@ def page_home():
     else:
         st.info("No projects yet.")
     if st.button("Create New Project"):
-        st.session_state.project = {"title": "", "description": "", "tasks": [[] for _ in range(8)], "generated_at": None}
+        st.session_state.project = {"title": "", "description": "", "tasks": [], "generated_at": None}
         st.session_state.page = "create"
         st.rerun()
 
 def page_create_project():
     st.header("Create New Project")
-    title = st.text_input("Project Name", value=st.session_state.project.get("title", ""))
-    desc = st.text_area("Description", value=st.session_state.project.get("description", ""), height=150)
-    if st.button("Save Project"):
+    # forms batch the inputs so typing doesn't rerun the script; only submit does
+    with st.form("create_project_form"):
+        title = st.text_input("Project Name", value=st.session_state.project.get("title", ""))
+        desc = st.text_area("Description", value=st.session_state.project.get("description", ""), height=150)
+        submitted = st.form_submit_button("Save Project")
+    if submitted:
         if not title.strip():
             st.error("Title required")
         else:
             project = {
                 "title": title.strip(),
                 "description": desc.strip(),
-                "tasks": [[] for _ in range(8)],
-                "generated_at": datetime.utcnow().isoformat()
+                "tasks": [],
+                "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
             }
             save_user_project(st.session_state.user, project)
             st.success("Project created!")
@@ -149,35 +342,61 @@ def page_create_project():
             st.rerun()
     st.divider()
     st.subheader("Ask DayBot to Generate Plan (optional)")
-    prompt = st.text_area("Prompt for AI", placeholder="e.g., Create an 8-day fitness challenge plan")
-    if st.button("Generate with AI"):
-        ok, out = call_gemini_text(prompt or "Create a simple 8-day project plan")
+    with st.form("generate_plan_form"):
+        prompt = st.text_area("Prompt for AI", placeholder="e.g., Create an 8-day fitness challenge plan")
+        generate = st.form_submit_button("Generate with AI")
+    if generate:
+        ok, out = call_gemini_stream(prompt or "Create a simple 8-day project plan")
         if ok:
-            st.text_area("AI Output", value=out, height=200)
+            # render tokens as they arrive instead of waiting for the full reply
+            try:
+                st.write_stream(out)
+            except Exception as e:
+                st.error(f"Gemini error: {e}")
         else:
             st.error(out)
 
+def _flat_tasks(tasks):
+    # projects saved before the flat layout hold eight per-day lists of strings
+    if tasks and isinstance(tasks[0], list):
+        return [{"day": i + 1, "text": t} for i, day in enumerate(tasks) for t in day]
+    return tasks
+
+def _tasks_from_grid(grid):
+    tasks = [
+        {"day": int(day), "text": text.strip()}
+        for day, text in zip(grid["day"], grid["text"])
+        if isinstance(text, str) and text.strip() and day in DAYS
+    ]
+    tasks.sort(key=lambda t: t["day"])
+    return tasks
+
 def page_planner():
     proj = st.session_state.project
     st.header(f"Planner — {proj.get('title')}")
     st.write(proj.get("description", ""))
-    tasks = proj.get("tasks", [[] for _ in range(8)])
-    for i in range(8):
-        st.subheader(f"Day {i + 1}")
-        for j, t in enumerate(tasks[i]):
-            cols = st.columns([0.9, 0.1])
-            cols[0].write(f"- {t}")
-            if cols[1].button("❌", key=f"del_{i}_{j}"):
-                tasks[i].pop(j)
-                save_user_project(st.session_state.user, proj)
-                st.rerun()
-        new_task = st.text_input(f"Add task for Day {i+1}", key=f"new_{i}")
-        if st.button(f"Add Task to Day {i+1}", key=f"add_{i}"):
-            if new_task.strip():
-                tasks[i].append(new_task.strip())
-                proj["tasks"] = tasks
-                save_user_project(st.session_state.user, proj)
-                st.rerun()
+    tasks = _flat_tasks(proj.get("tasks", []))
+    # one grid widget for all 8 days instead of a row of widgets per task; the form
+    # holds edits client-side so a batch of changes costs one rerun on Save
+    grid = {"day": [t["day"] for t in tasks], "text": [t["text"] for t in tasks]}
+    with st.form("planner_form"):
+        edited = st.data_editor(
+            grid,
+            column_config=PLANNER_COLUMNS,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            key="planner_grid",
+        )
+        st.form_submit_button("Save Plan")
+    new_tasks = _tasks_from_grid(edited)
+    if new_tasks != tasks:
+        # the form already batches edits into one submit, so save it right away; then
+        # rerun, because data_editor's widget id is derived from its data and the
+        # next batch must be made against a grid rebuilt from the saved tasks
+        proj["tasks"] = new_tasks
+        save_user_project(st.session_state.user, proj)
+        st.rerun()
     if st.button("⬅ Back to Home"):
         st.session_state.page = "home"
         st.rerun()